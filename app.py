@@ -3,7 +3,7 @@ import asyncio
 import logging
 import os
 import sys
-import traceback
+import time
 import uuid
 from asyncio.log import logger
 from datetime import datetime
@@ -18,7 +18,6 @@ from aiohttp.web import Response
 from botbuilder.core import TurnContext
 from botbuilder.core.integration import aiohttp_error_middleware
 from botbuilder.integration.aiohttp import CloudAdapter
-from botbuilder.integration.aiohttp import ConfigurationBotFrameworkAuthentication
 from botbuilder.schema import Activity
 from botbuilder.schema import ActivityTypes
 
@@ -27,7 +26,15 @@ from config import DefaultConfig
 from helpers import Helpers
 from helpers import MessageHelper
 from helpers import MSGraphHelper
+from helpers import RosterHelper
+from helpers import json_codec
+from helpers.activity_recorder import ActivityRecorder
+from helpers.auth_cache import CachingBotFrameworkAuthentication
 from helpers.db_helper import DBHelper
+from helpers.db_helper import MSG_TO_DELETE_LOCK_KEY
+from helpers.log_pipeline import init_log_pipeline
+from helpers.perf_profile import apply_performance_profile
+from helpers.prefork import run_workers
 
 blibs.init_root_logger()
 logging.getLogger("urllib3").setLevel(logging.ERROR)
@@ -39,24 +46,23 @@ logging.getLogger("msrest").setLevel(logging.ERROR)
 
 dotenv.load_dotenv()
 CONFIG = DefaultConfig()
+init_log_pipeline(CONFIG.LOG_INFO_SAMPLE_RATE)
+LOOP_FACTORY = apply_performance_profile(CONFIG.PERFORMANCE_PROFILE)
 
 # Create adapter.
 # See https://aka.ms/about-bot-adapter to learn more about how bots work.
-ADAPTER = CloudAdapter(
-    ConfigurationBotFrameworkAuthentication(
-        CONFIG,
-        credentials_factory=CONFIG.get_credential_factory(),
-    )
+AUTHENTICATION = CachingBotFrameworkAuthentication(
+    CONFIG,
+    credentials_factory=CONFIG.get_credential_factory(),
+    cache_size=CONFIG.AUTH_CACHE_SIZE,
 )
+ADAPTER = CloudAdapter(AUTHENTICATION)
 
 
 # Catch-all for errors.
 async def on_error(context: TurnContext, error: Exception):
-    # This check writes out errors to console log .vs. app insights.
-    # NOTE: In production environment, you should consider logging this to Azure
-    #       application insights.
-    print(f"\n [on_turn_error] unhandled error: {error}", file=sys.stderr)
-    traceback.print_exc()
+    # Written by the log pipeline thread, only the traceback is rendered on the event loop
+    logger.error(f"[on_turn_error] unhandled error: {error}", exc_info=error)
 
     # NOPE
     # await context.send_activity("The bot encountered an error or bug, please contact the maintainer.")
@@ -86,7 +92,22 @@ APP_ID = CONFIG.APP_ID if CONFIG.APP_ID else uuid.uuid4()
 
 # Listen for incoming requests on /api/messages.
 async def messages(req: Request) -> Response:
-    return await ADAPTER.process(req, BOT)  # type: ignore
+    recorder: ActivityRecorder | None = req.app.get("recorder")
+    if recorder is None:
+        return await ADAPTER.process(req, BOT)  # type: ignore
+
+    try:
+        body = await req.json(loads=json_codec.loads)
+    except ValueError:
+        # not an activity, the adapter answers with the right status
+        return await ADAPTER.process(req, BOT)  # type: ignore
+    start = time.monotonic()
+    response = await ADAPTER.process(req, BOT)
+    status = response.status if response is not None else 200
+    # rejected requests (authentication, content type) are not replayable traffic
+    if 200 <= status < 300:
+        recorder.record(body, start, time.monotonic() - start, status)
+    return response  # type: ignore
 
 
 async def healthcheck(req: Request) -> Response:
@@ -122,6 +143,10 @@ async def periodic_task(app):
         helpers: Helpers = app["helpers"]
         while True:
             try:
+                # a single process (worker or replica) cleans up, the others stand by
+                if not await helpers.db.hold_advisory_lock(MSG_TO_DELETE_LOCK_KEY):
+                    await asyncio.sleep(30)
+                    continue
                 connection: asyncpg.pool.PoolConnectionProxy
                 async with await helpers.db.acquire() as connection:
                     stmt = await connection.prepare(
@@ -150,41 +175,135 @@ async def periodic_task(app):
     yield
 
     task.cancel()
-    await task
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def signing_keys_refresh_task(app):
+    if not CONFIG.APP_ID:
+        # authentication disabled, no token to validate
+        yield
+        return
+
+    async def refresh_loop():
+        while True:
+            # first refreshed by warm_up
+            await asyncio.sleep(CONFIG.AUTH_SIGNING_KEYS_REFRESH_INTERVAL)
+            await AUTHENTICATION.refresh_signing_keys()
+
+    task = asyncio.create_task(_log_exception(refresh_loop()))
+
+    yield
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def warm_up_signing_keys():
+    if not CONFIG.APP_ID:
+        # authentication disabled, no token to validate
+        return
+    # otherwise the first request fetches them with blocking requests on the event loop
+    await AUTHENTICATION.refresh_signing_keys()
+
+
+async def warm_up(helpers: Helpers):
+    """Pre-create pools, clients and tokens, the server only starts listening once done.
+
+    The database is required, connector and graph tokens and the inbound token signing keys
+    are only logged on failure so a login outage does not prevent the bot from starting.
+    """
+
+    async def timed(name: str, awaitable: Awaitable, required: bool):  # type: ignore
+        start = time.monotonic()
+        try:
+            await awaitable
+        except Exception as e:
+            if required:
+                raise
+            logger.warning(f"{name} warm up failed with {type(e)}: {e}")
+            return
+        logging.info("%s warm up done in %.3fs", name, time.monotonic() - start)
+
+    start = time.monotonic()
+    await asyncio.gather(
+        timed("database", helpers.db.warm_up(), required=True),
+        timed("connector", helpers.msg.warm_up(), required=False),
+        timed("graph", helpers.graph.warm_up(), required=False),
+        timed("signing keys", warm_up_signing_keys(), required=False),
+    )
+    logging.info("warm up done in %.3fs", time.monotonic() - start)
+
+
+async def activity_recorder(app: web.Application):
+    """Opt-in recording of incoming activities, see bench/replay.py"""
+    if not CONFIG.ACTIVITY_RECORD_PATH:
+        yield
+        return
+    recorder = ActivityRecorder(CONFIG.ACTIVITY_RECORD_PATH)
+    recorder.start()
+    app["recorder"] = recorder
+
+    yield
+
+    del app["recorder"]
+    await asyncio.to_thread(recorder.close)
 
 
 async def init_helpers(app: web.Application):
     """Initialize a connection pool."""
     try:
+        msg = MessageHelper(app, ADAPTER, CONFIG)
+        db = DBHelper(app, CONFIG)
         helpers = Helpers(
-            MessageHelper(app, ADAPTER, CONFIG),
+            msg,
             MSGraphHelper(app, ADAPTER, CONFIG),
-            DBHelper(app, CONFIG),
+            db,
+            RosterHelper(app, msg, db, CONFIG),
         )
         app["helpers"] = helpers
-        await helpers.db.check_connection()
+        await warm_up(helpers)
     except Exception as e:
         logger.exception(e)
         raise e
 
     yield
 
-    app["helpers"].db.close()
+    await app["helpers"].roster.close()
+    await app["helpers"].db.close()
 
 
 APP = web.Application(middlewares=[aiohttp_error_middleware])
 APP.router.add_post("/api/messages", messages)
 APP.router.add_get("/healthz", healthcheck)
+APP.cleanup_ctx.append(activity_recorder)
 APP.cleanup_ctx.append(init_helpers)
 APP.cleanup_ctx.append(periodic_task)
+APP.cleanup_ctx.append(signing_keys_refresh_task)
 
 # Create the Bot
 BOT = NotiTeamsBot(APP)
 
 
+def run_server():
+    web.run_app(
+        APP,
+        host="0.0.0.0",
+        port=CONFIG.PORT,
+        loop=LOOP_FACTORY(),
+        # workers each bind the port, the kernel spreads connections between them
+        reuse_port=CONFIG.WORKERS > 1,
+        shutdown_timeout=CONFIG.SHUTDOWN_TIMEOUT,
+    )
+
+
 if __name__ == "__main__":
     logging.info("starting app version %s", os.environ.get("VERSION", "v0.0.0-dev"))
     try:
-        web.run_app(APP, host="0.0.0.0", port=CONFIG.PORT)
+        if CONFIG.WORKERS > 1:
+            # fail before spawning rather than in every worker
+            CONFIG.check_workers()
+            # leave room for the cleanup contexts once connections are drained
+            sys.exit(run_workers(run_server, CONFIG.WORKERS, CONFIG.SHUTDOWN_TIMEOUT + 15))
+        run_server()
     except Exception as error:
         raise error
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Per-request inbound authentication CPU, with and without the validated token cache.
+
+Usage: ./bench/auth_cache.py [requests]
+
+Runs offline: a local RSA key is installed as the Bot Framework channel signing key.
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import jwt
+from botbuilder.integration.aiohttp import ConfigurationBotFrameworkAuthentication
+from botbuilder.schema import Activity
+from botframework.connector.auth import AuthenticationConstants
+from botframework.connector.auth import JwtTokenExtractor
+from botframework.connector.auth import PasswordServiceClientCredentialFactory
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from helpers.auth_cache import CachingBotFrameworkAuthentication  # noqa: E402
+
+APP_ID = "00000000-0000-0000-0000-000000000001"
+SERVICE_URL = "https://smba.trafficmanager.net/amer/"
+
+
+class Config:
+    APP_ID = APP_ID
+    APP_PASSWORD = "bench"
+    APP_TYPE = "MultiTenant"
+    APP_TENANTID = ""
+
+
+def install_signing_key() -> str:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(RSAAlgorithm.to_jwk(key.public_key()))
+    jwk.update({"kid": "bench", "endorsements": ["msteams"]})
+    metadata = JwtTokenExtractor.get_open_id_metadata(
+        AuthenticationConstants.TO_BOT_FROM_CHANNEL_OPENID_METADATA_URL
+    )
+    metadata.keys = [jwk]
+    metadata.last_updated = datetime.now()
+    return jwt.encode(
+        {
+            "iss": AuthenticationConstants.TO_BOT_FROM_CHANNEL_TOKEN_ISSUER,
+            "aud": APP_ID,
+            "serviceurl": SERVICE_URL,
+            "exp": int(time.time()) + 3600,
+        },
+        key,
+        algorithm="RS256",
+        headers={"kid": "bench"},
+    )
+
+
+async def run(auth, header: str, requests: int) -> float:
+    activity = Activity(type="message", channel_id="msteams", service_url=SERVICE_URL)
+    start = time.process_time()
+    for _ in range(requests):
+        await auth.authenticate_request(activity, header)
+    return time.process_time() - start
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    header = f"Bearer {install_signing_key()}"
+    credentials_factory = PasswordServiceClientCredentialFactory(app_id=APP_ID, password="bench")
+    for label, auth_class in (
+        ("uncached", ConfigurationBotFrameworkAuthentication),
+        ("cached", CachingBotFrameworkAuthentication),
+    ):
+        auth = auth_class(Config, credentials_factory=credentials_factory)
+        elapsed = await run(auth, header, requests)
+        print(f"{label + ':':<10} {elapsed / requests * 1e6:>8.1f} us CPU/request")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""/api/messages throughput under each PERFORMANCE_PROFILE, with every outbound call stubbed in process.
+
+Usage: ./bench/profiles.py recording.ndjson.gz [--requests N] [--concurrency N] [--rounds N]
+
+Each profile runs in a fresh interpreter. The activities of the recording are posted in a loop by
+``--concurrency`` clients. The database is the in-memory stub of bench/replay.py without latency,
+and Bot Framework connector, token and Teams calls return immediately without leaving the process:
+msrest builds an expensive retry policy for every client botbuilder creates per turn, which would
+otherwise dominate. What is left is the event loop, aiohttp and JSON (de)serialization on both sides
+of the connection, plus the bot handlers themselves. ``fast`` requires uvloop and orjson.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any
+
+from aiohttp import ClientSession
+from aiohttp import TCPConnector
+from aiohttp.test_utils import TestServer
+from botbuilder.core.teams.teams_info import TeamsInfo
+from botbuilder.schema import ConversationResourceResponse
+from botbuilder.schema import ResourceResponse
+from botbuilder.schema.teams import TeamDetails
+from botbuilder.schema.teams import TeamsPagedMembersResult
+from botframework.connector.auth._connector_factory_impl import _ConnectorFactoryImpl
+
+from replay import load
+from replay import percentile
+from replay import ROOT
+from replay import StubConnection
+from replay import StubDatabase
+
+SERVICE_URL = "https://smba.invalid/"
+PROFILES = ("default", "fast")
+
+
+class StubConversations:
+    async def reply_to_activity(self, *args, **kwargs):
+        return ResourceResponse(id=str(uuid.uuid4()))
+
+    send_to_conversation = reply_to_activity
+    update_activity = reply_to_activity
+
+    async def delete_activity(self, *args, **kwargs) -> None: ...
+
+    async def create_conversation(self, parameters, **kwargs):
+        return ConversationResourceResponse(id=f"a:{uuid.uuid4()}", service_url=SERVICE_URL)
+
+    async def get_teams_conversation_paged_members(self, *args, **kwargs):
+        return TeamsPagedMembersResult(members=[])
+
+
+class StubConnectorClient:
+    def __init__(self) -> None:
+        self.conversations = StubConversations()
+
+
+def stub_outbound(notiteams) -> None:
+    from helpers import message_helper
+    from helpers.db_helper import DBHelper
+
+    stub_db = StubDatabase(0)
+    connector_client = StubConnectorClient()
+
+    async def pool(self):
+        return stub_db
+
+    async def lock_connection(self):
+        return StubConnection(stub_db)
+
+    async def create_connector_client(self, service_url, audience=None):
+        return connector_client
+
+    async def create_user_token_client(claims_identity, logger=None):
+        return None
+
+    async def get_team_details(turn_context, team_id=""):
+        return TeamDetails(id=team_id or "19:team@thread.tacv2", name="team")
+
+    DBHelper.pool = pool  # type: ignore
+    DBHelper.lock_connection = lock_connection  # type: ignore
+    _ConnectorFactoryImpl.create = create_connector_client  # type: ignore
+    notiteams.AUTHENTICATION.create_user_token_client = create_user_token_client
+    TeamsInfo.get_team_details = staticmethod(get_team_details)  # type: ignore
+    message_helper.DEFAULT_SERVICE_URL = SERVICE_URL
+
+
+async def drive(args: argparse.Namespace) -> dict[str, Any]:
+    import app as notiteams
+
+    stub_outbound(notiteams)
+    server = TestServer(notiteams.APP)
+    await server.start_server()
+    url = server.make_url("/api/messages")
+    activities = [dict(entry["activity"], serviceUrl=SERVICE_URL) for entry in load(args.recording)]
+    latencies: list[float] = []
+    errors = 0
+
+    async with ClientSession(connector=TCPConnector(limit=args.concurrency)) as session:
+
+        async def client(sequence) -> None:
+            nonlocal errors
+            for activity in sequence:
+                start = time.monotonic()
+                async with session.post(url, json=activity) as response:
+                    await response.read()
+                    errors += response.status >= 400
+                latencies.append(time.monotonic() - start)
+
+        # warm caches (cards, statement texts, connections) outside the measurement
+        await client(activities)
+        latencies.clear()
+
+        sequence = iter(list(itertools.islice(itertools.cycle(activities), args.requests)))
+        start = time.monotonic()
+        await asyncio.gather(*(client(sequence) for _ in range(args.concurrency)))
+        elapsed = time.monotonic() - start
+
+    while notiteams.APP["helpers"].roster._tasks:
+        await asyncio.sleep(0.05)
+    await server.close()
+    return {
+        "profile": args.run,
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed": elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run(args: argparse.Namespace) -> None:
+    os.environ["PERFORMANCE_PROFILE"] = args.run
+    os.chdir(ROOT)
+    import app as notiteams
+
+    with asyncio.Runner(loop_factory=notiteams.LOOP_FACTORY) as runner:
+        print(json.dumps(runner.run(drive(args))))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("recording")
+    parser.add_argument("--requests", type=int, default=5000, help="activities posted per profile")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight")
+    parser.add_argument("--rounds", type=int, default=5, help="runs of each profile, alternating")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args)
+        return
+
+    reports: dict[str, list[dict[str, Any]]] = {profile: [] for profile in PROFILES}
+    # profiles alternate so drift on the machine affects both alike
+    for _ in range(args.rounds):
+        for profile in PROFILES:
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    os.path.abspath(args.recording),
+                    f"--requests={args.requests}",
+                    f"--concurrency={args.concurrency}",
+                    f"--run={profile}",
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            reports[profile].append(json.loads(output.splitlines()[-1]))
+
+    print(f"medians of {args.rounds} rounds")
+    print(f"{'profile':<8} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50':>8} {'p99':>8}")
+    for profile, runs in reports.items():
+        print(
+            f"{profile:<8} {runs[0]['requests']:>8} {sum(r['errors'] for r in runs):>6} "
+            f"{statistics.median(r['requests'] / r['elapsed'] for r in runs):>8.0f} "
+            f"{statistics.median(r['p50_ms'] for r in runs):>6.1f}ms "
+            f"{statistics.median(r['p99_ms'] for r in runs):>6.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
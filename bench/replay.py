@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""Replay a recorded activity file (see ACTIVITY_RECORD_PATH) against the app with local stubs.
+
+Usage: ./bench/replay.py recording.ndjson.gz [--speed N] [--repeat N] [--profile default|fast]
+                         [--db-latency MS] [--roster-size N] [--json]
+
+The Bot Framework connector and Microsoft Graph are served by a local aiohttp stub, the database
+by an in-memory pool stub answering the statements of DBHelper. Authentication is disabled.
+Reports per-handler latency and database statement counts, ``--json`` to compare builds.
+"""
+import argparse
+import asyncio
+import contextvars
+import gzip
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any
+
+from aiohttp import ClientSession
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+# Must be set before the app and its configuration are imported
+os.environ["MICROSOFT_APP_ID"] = ""
+os.environ["MICROSOFT_APP_PASSWORD"] = "replay"
+os.environ["MICROSOFT_APP_TENANT_ID"] = ""
+os.environ["ACTIVITY_RECORD_PATH"] = ""
+os.environ["DATABASE_URL"] = "postgresql://replay-stub"
+
+HANDLER = contextvars.ContextVar("replay_handler", default="startup")
+HANDLER_HEADER = "X-Replay-Handler"
+
+
+def handler_key(activity: dict[str, Any]) -> str:
+    activity_type = str(activity.get("type", "unknown"))
+    if activity_type == "message":
+        return "message:submit" if isinstance(activity.get("value"), dict) else "message:text"
+    if activity_type == "installationUpdate":
+        return f"installationUpdate:{activity.get('action', '')}"
+    if activity_type == "conversationUpdate":
+        channel_data = activity.get("channelData") or {}
+        return f"conversationUpdate:{channel_data.get('eventType', 'members')}"
+    if activity_type == "invoke":
+        return f"invoke:{activity.get('name', '')}"
+    return activity_type
+
+
+class StubStatement:
+    def __init__(self, rows: list[dict[str, Any]]) -> None:
+        self._rows = rows
+
+    async def cursor(self):
+        for row in self._rows:
+            yield row
+
+
+class StubConnection:
+    """Answers the statements issued by DBHelper and app.py from in-memory state"""
+
+    def __init__(self, db: "StubDatabase") -> None:
+        self._db = db
+
+    async def _statement(self, query: str) -> str:
+        kind = " ".join(query.split()[:3])
+        self._db.statements[HANDLER.get()][kind] += 1
+        if self._db.latency:
+            await asyncio.sleep(self._db.latency)
+        return query
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def _prepare(self, query: str, **kwargs) -> None:
+        self._db.statements[HANDLER.get()]["PREPARE"] += 1
+
+    async def prepare(self, query: str) -> StubStatement:
+        await self._statement(query)
+        rows = [{"id": i, **row} for i, row in self._db.msg_to_delete.items()]
+        return StubStatement(rows)
+
+    async def fetchval(self, query: str, *args) -> Any:
+        await self._statement(query)
+        return True
+
+    async def fetchrow(self, query: str, *args) -> dict[str, Any] | None:
+        await self._statement(query)
+        db = self._db
+        if "FROM conversation_reference cr" in query:
+            ref = db.references.get(args[:3])
+            if ref is None:
+                return None
+            token = db.tokens.get(ref["conversation_reference_id"])
+            return {**ref, **(token or {"conversation_token": None, "conversation_token_id": None})}
+        if "INSERT INTO conversation_reference" in query:
+            ref = {"conversation_reference_id": next(db.ids), "reference_hash": args[5]}
+            db.references[args[:3]] = ref
+            return {"conversation_reference_id": ref["conversation_reference_id"]}
+        if "INSERT INTO conversation_token" in query:
+            token = {"conversation_token": args[0] or uuid.uuid4(), "conversation_token_id": next(db.ids)}
+            db.tokens[args[1]] = token
+            return token
+        return None
+
+    async def execute(self, query: str, *args) -> str:
+        await self._statement(query)
+        if "INSERT INTO msg_to_delete" in query:
+            self._db.msg_to_delete[next(self._db.ids)] = {"conv_id": args[0], "activity_id": args[1]}
+        elif "DELETE FROM msg_to_delete" in query:
+            self._db.msg_to_delete.pop(args[0], None)
+        elif "FROM aadoid_to_tid_staging" in query:
+            return f"INSERT 0 {self._db.staged}"
+        return "INSERT 0 1"
+
+    async def copy_records_to_table(self, table: str, *, records, columns) -> None:
+        await self._statement(f"COPY {table} FROM")
+        self._db.staged = len(records)
+
+    async def close(self) -> None: ...
+
+    def terminate(self) -> None: ...
+
+
+class StubDatabase:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.ids = itertools.count(1)
+        self.references: dict[tuple[str, str, str], dict[str, Any]] = {}
+        self.tokens: dict[int, dict[str, Any]] = {}
+        self.msg_to_delete: dict[int, dict[str, Any]] = {}
+        self.staged = 0
+        self.statements: defaultdict[str, Counter[str]] = defaultdict(Counter)
+
+    @asynccontextmanager
+    async def acquire(self, timeout: float | None = None):
+        yield StubConnection(self)
+
+    async def close(self) -> None: ...
+
+
+class StubServices:
+    """Bot Framework connector and Microsoft Graph endpoints used by the bot"""
+
+    def __init__(self, roster_size: int) -> None:
+        self.roster_size = roster_size
+        self.calls: Counter[str] = Counter()
+        self.ids = itertools.count(1)
+        self.app = web.Application(middlewares=[self._count])
+        self.app.router.add_post("/v3/conversations", self.create_conversation)
+        self.app.router.add_post("/v3/conversations/{conv}/activities", self.activity)
+        self.app.router.add_post("/v3/conversations/{conv}/activities/{aid}", self.activity)
+        self.app.router.add_put("/v3/conversations/{conv}/activities/{aid}", self.activity)
+        self.app.router.add_delete("/v3/conversations/{conv}/activities/{aid}", self.empty)
+        self.app.router.add_get("/v3/conversations/{conv}/pagedmembers", self.paged_members)
+        self.app.router.add_get("/v3/teams/{team}", self.team_details)
+        self.app.router.add_get("/v1.0/chats/{chat}/members", self.chat_members)
+
+    def start(self) -> str:
+        """Serve from a separate thread and loop, botbuilder issues some connector calls synchronously"""
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._runner = web.AppRunner(self.app, access_log=None)
+
+        def serve():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._runner.setup())
+            self._loop.run_until_complete(web.TCPSite(self._runner, "127.0.0.1", 0).start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+
+        self._thread = threading.Thread(target=serve, name="replay-stubs", daemon=True)
+        self._thread.start()
+        started.wait()
+        return f"http://127.0.0.1:{self._runner.addresses[0][1]}/"
+
+    def stop(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    @web.middleware
+    async def _count(self, request: web.Request, handler):
+        resource = request.match_info.route.resource
+        self.calls[f"{request.method} {resource.canonical if resource else request.path}"] += 1
+        return await handler(request)
+
+    async def create_conversation(self, request: web.Request) -> web.Response:
+        return web.json_response({"id": f"a:replay-{next(self.ids)}", "activityId": str(next(self.ids))})
+
+    async def activity(self, request: web.Request) -> web.Response:
+        return web.json_response({"id": str(next(self.ids))})
+
+    async def empty(self, request: web.Request) -> web.Response:
+        return web.json_response({})
+
+    async def team_details(self, request: web.Request) -> web.Response:
+        return web.json_response({"id": request.match_info["team"], "name": "Replay team"})
+
+    async def chat_members(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {"value": [{"displayName": f"Member {i}", "userId": str(uuid.uuid4())} for i in range(6)]}
+        )
+
+    async def paged_members(self, request: web.Request) -> web.Response:
+        page_size = int(request.query.get("pageSize", "500"))
+        start = int(request.query.get("continuationToken", "0"))
+        end = min(start + page_size, self.roster_size)
+        members = [
+            {
+                "id": f"29:replay-{i}",
+                "aadObjectId": str(uuid.UUID(int=i + 1)),
+                "name": f"Member {i}",
+            }
+            for i in range(start, end)
+        ]
+        body: dict[str, Any] = {"members": members}
+        if end < self.roster_size:
+            body["continuationToken"] = str(end)
+        return web.json_response(body)
+
+
+def load(path: str) -> list[dict[str, Any]]:
+    with gzip.open(path, "rt", encoding="utf-8") as recording:
+        entries = [json.loads(line) for line in recording if line.strip()]
+    # older recordings also hold rejected requests
+    entries = [entry for entry in entries if 200 <= entry.get("status", 200) < 300]
+    entries.sort(key=lambda entry: entry["t"])
+    return entries
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+
+async def replay(args: argparse.Namespace) -> dict[str, Any]:
+    import app as notiteams
+    from helpers import message_helper
+    from helpers.db_helper import DBHelper
+
+    stub_db = StubDatabase(args.db_latency / 1000)
+    stub_services = StubServices(args.roster_size)
+
+    async def stub_pool(self):
+        return stub_db
+
+    async def stub_lock_connection(self):
+        return StubConnection(stub_db)
+
+    DBHelper.pool = stub_pool  # type: ignore
+    DBHelper.lock_connection = stub_lock_connection  # type: ignore
+
+    @web.middleware
+    async def tag_handler(request: web.Request, handler):
+        HANDLER.set(request.headers.get(HANDLER_HEADER, "unknown"))
+        return await handler(request)
+
+    async def stub_graph(app: web.Application):
+        graph = app["helpers"].graph
+        graph._access_token = "replay"
+        graph._decoded_access_token = {"exp": time.time() + 86400}
+        graph._base = f"{service_url}v1.0/"
+
+    service_url = stub_services.start()
+    message_helper.DEFAULT_SERVICE_URL = service_url
+
+    notiteams.APP.middlewares.insert(0, tag_handler)
+    notiteams.APP.on_startup.append(stub_graph)
+    app_server = TestServer(notiteams.APP)
+    await app_server.start_server()
+
+    recording = load(args.recording)
+    span = (recording[-1]["t"] - recording[0]["t"]) if recording else 0
+    entries = [dict(e, t=e["t"] + i * span) for i in range(args.repeat) for e in recording]
+    latencies: defaultdict[str, list[float]] = defaultdict(list)
+    recorded: defaultdict[str, list[float]] = defaultdict(list)
+    errors: Counter[str] = Counter()
+
+    async with ClientSession() as session:
+
+        async def send(entry: dict[str, Any], at: float) -> None:
+            activity = dict(entry["activity"], serviceUrl=service_url)
+            key = handler_key(activity)
+            await asyncio.sleep(max(at - time.monotonic(), 0))
+            start = time.monotonic()
+            async with session.post(
+                app_server.make_url("/api/messages"),
+                json=activity,
+                headers={HANDLER_HEADER: key},
+            ) as response:
+                await response.read()
+                if response.status >= 400:
+                    errors[key] += 1
+            latencies[key].append(time.monotonic() - start)
+            recorded[key].append(entry["duration"])
+
+        origin = time.monotonic() + 0.1
+        first = entries[0]["t"] if entries else 0
+        start = time.monotonic()
+        await asyncio.gather(*(send(e, origin + (e["t"] - first) / args.speed) for e in entries))
+        elapsed = time.monotonic() - start
+
+    # let background jobs (roster preload) finish before shutting down
+    while notiteams.APP["helpers"].roster._tasks:
+        await asyncio.sleep(0.05)
+    await app_server.close()
+    stub_services.stop()
+
+    return {
+        "activities": len(entries),
+        "speed": args.speed,
+        "profile": args.profile,
+        "elapsed": elapsed,
+        "handlers": {
+            key: {
+                "count": len(values),
+                "errors": errors[key],
+                "p50_ms": percentile(values, 0.5) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "max_ms": max(values) * 1000,
+                "recorded_p50_ms": percentile(recorded[key], 0.5) * 1000,
+                "db_statements": sum(stub_db.statements[key].values()),
+                "db_statements_per_activity": sum(stub_db.statements[key].values()) / len(values),
+                "db_statement_kinds": dict(stub_db.statements[key]),
+            }
+            for key, values in sorted(latencies.items())
+        },
+        "db_statements_outside_handlers": {
+            key: dict(counter) for key, counter in stub_db.statements.items() if key not in latencies
+        },
+        "service_calls": dict(stub_services.calls),
+    }
+
+
+def print_report(report: dict[str, Any]) -> None:
+    print(
+        f"{report['activities']} activities replayed at {report['speed']}x "
+        f"with profile {report['profile']} in {report['elapsed']:.2f}s"
+    )
+    print(
+        f"{'handler':<34} {'count':>6} {'err':>4} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} "
+        f"{'rec p50':>8} {'db/act':>7}"
+    )
+    for key, stats in report["handlers"].items():
+        print(
+            f"{key:<34} {stats['count']:>6} {stats['errors']:>4} {stats['p50_ms']:>7.1f}ms "
+            f"{stats['p95_ms']:>6.1f}ms {stats['p99_ms']:>6.1f}ms {stats['max_ms']:>6.1f}ms "
+            f"{stats['recorded_p50_ms']:>6.1f}ms {stats['db_statements_per_activity']:>7.1f}"
+        )
+    print("service calls:", ", ".join(f"{k}={v}" for k, v in sorted(report["service_calls"].items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("recording")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier (default: 1)")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the recording N times back to back")
+    parser.add_argument("--profile", default="default", help="PERFORMANCE_PROFILE to run the app with")
+    parser.add_argument("--db-latency", type=float, default=1.0, help="stub statement latency in ms")
+    parser.add_argument("--roster-size", type=int, default=0, help="members returned by the roster stub")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    os.environ["PERFORMANCE_PROFILE"] = args.profile
+    os.chdir(ROOT)
+    import app as notiteams
+
+    with asyncio.Runner(loop_factory=notiteams.LOOP_FACTORY) as runner:
+        report = runner.run(replay(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Time to readiness: module import then application startup (helpers creation and warm up).
+
+Usage: ./bench/startup.py [runs]
+
+Uses the same environment / .env as the app (database and bot credentials are required).
+Each run is a fresh interpreter so imports are measured cold.
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+
+async def main():
+    runner = app.web.AppRunner(app.APP)
+    await runner.setup()
+    ready = time.perf_counter()
+    await runner.cleanup()
+    return ready
+
+ready = asyncio.run(main())
+print(json.dumps({"import": imported - start, "startup": ready - imported, "total": ready - start}))
+"""
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    for phase in ("import", "startup", "total"):
+        values = sorted(result[phase] for result in results)
+        median = values[len(values) // 2]
+        print(f"{phase + ':':<9} min {values[0]:.3f}s  median {median:.3f}s  max {values[-1]:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Compare insert throughput of server side uuid_generate_v7() against client side UUIDv7.
+
+Usage: DATABASE_URL=postgresql://... ./bench/uuid7_insert.py [rows] [concurrency]
+
+Requires the notiteams schema (for public.uuid_generate_v7), works on temporary tables only.
+"""
+import asyncio
+import os
+import sys
+import time
+
+import asyncpg
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from helpers.uuid7 import uuid7  # noqa: E402
+
+CREATE = """
+CREATE TEMPORARY TABLE IF NOT EXISTS bench_uuid7 (
+    id uuid DEFAULT public.uuid_generate_v7() NOT NULL PRIMARY KEY,
+    payload bigint NOT NULL
+)
+"""
+
+
+async def run(pool: asyncpg.Pool, rows: int, concurrency: int, client_side: bool) -> float:
+    async def worker(count: int):
+        async with pool.acquire() as connection:
+            await connection.execute(CREATE)
+            await connection.execute("TRUNCATE bench_uuid7")
+            if client_side:
+                stmt = await connection.prepare("INSERT INTO bench_uuid7 (id, payload) VALUES ($1, $2)")
+                for i in range(count):
+                    await stmt.fetch(uuid7(), i)
+            else:
+                stmt = await connection.prepare("INSERT INTO bench_uuid7 (payload) VALUES ($1)")
+                for i in range(count):
+                    await stmt.fetch(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(rows // concurrency) for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    start = time.perf_counter()
+    for _ in range(rows):
+        uuid7()
+    print(f"python uuid7():        {rows / (time.perf_counter() - start):>12,.0f} ids/s")
+
+    pool = await asyncpg.create_pool(os.environ["DATABASE_URL"], min_size=concurrency, max_size=concurrency)
+    assert pool is not None
+    try:
+        for label, client_side in (("server uuid_generate_v7", False), ("client uuid7", True)):
+            elapsed = await run(pool, rows, concurrency, client_side)
+            print(f"{label + ':':<22} {rows / elapsed:>12,.0f} inserts/s ({elapsed:.2f}s)")
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,10 +1,12 @@
-import json
 import logging
+from functools import lru_cache
+from typing import Any
 
 from aiohttp import web
 from botbuilder.core import ActivityHandler
 from botbuilder.core import CardFactory
 from botbuilder.core import TurnContext
+from botbuilder.core.teams import teams_get_team_info
 from botbuilder.core.teams.teams_info import TeamsInfo
 from botbuilder.schema import Activity
 from botbuilder.schema import ActivityTypes
@@ -13,11 +15,21 @@ from botbuilder.schema import ResourceResponse
 from opentelemetry import trace
 
 from helpers import Helpers
+from helpers import json_codec
 from helpers.db_helper import AADOIDInfo
+from helpers.db_helper import ConversationReferencePayload
+from helpers.log_pipeline import LazyJSON
 
 tracer = trace.get_tracer(__name__)
 
 
+@lru_cache
+def load_card(path: str) -> dict[str, Any]:
+    with open(path, "rb") as card:
+        ret: dict[str, Any] = json_codec.loads(card.read())
+        return ret
+
+
 class NotiTeamsBot(ActivityHandler):
     def __init__(self, app: web.Application):
         self.app = app
@@ -58,10 +70,21 @@ class NotiTeamsBot(ActivityHandler):
 
     async def on_installation_update_add(self, turn_context: TurnContext):
         await self._add_conversation_reference(turn_context.activity)
+        self._schedule_roster_preload(turn_context.activity)
         try:
             await self._on_request_token(turn_context)
         except Exception as ex:
-            print(ex)
+            self.log.exception(f"token request on installation failed: {ex}")
+
+    def _schedule_roster_preload(self, activity: Activity):
+        team_info = teams_get_team_info(activity)
+        if team_info is None or not team_info.id or activity.channel_data is None or not activity.service_url:
+            return
+        self.helpers.roster.schedule(
+            tenant_id=activity.channel_data.get("tenant", {}).get("id"),
+            service_url=activity.service_url,
+            team_id=team_info.id,
+        )
 
     @tracer.start_as_current_span("on_message_activity")
     async def on_message_activity(self, turn_context: TurnContext):
@@ -77,7 +100,7 @@ class NotiTeamsBot(ActivityHandler):
                 await turn_context.send_activity(
                     Activity(
                         type=ActivityTypes.message,
-                        attachments=[CardFactory.adaptive_card(json.load(open("cards/gretting.json")))],
+                        attachments=[CardFactory.adaptive_card(load_card("cards/gretting.json"))],
                         summary="Hi, to get a token, click this message.",
                     )
                 )
@@ -90,7 +113,7 @@ class NotiTeamsBot(ActivityHandler):
                         Activity(
                             type=ActivityTypes.message,
                             attachments=[
-                                CardFactory.adaptive_card(json.load(open("cards/gretting-personal.json")))
+                                CardFactory.adaptive_card(load_card("cards/gretting-personal.json"))
                             ],
                             summary="Hi, to get a token, click this message.",
                         )
@@ -98,10 +121,8 @@ class NotiTeamsBot(ActivityHandler):
                     return
 
         elif isinstance(turn_context.activity.value, dict):
-            self.log.info(
-                f"Received a message with a value: {json.dumps(turn_context.activity.value)}",
-                extra={"value": json.dumps(turn_context.activity.value)},
-            )
+            value = LazyJSON(turn_context.activity.value)
+            self.log.info("Received a message with a value: %s", value, extra={"value": value})
             if "action" in turn_context.activity.value:
                 if turn_context.activity.value.get("action") == "requestToken":
                     await self._on_request_token(turn_context)
@@ -136,8 +157,7 @@ class NotiTeamsBot(ActivityHandler):
             tenant_id=tenant_id,
             conversation_teams_id=turn_context.activity.conversation.id.split(";")[0],
             requester_aadoid=conversation_reference.user.aad_object_id,
-            conversation_reference=conversation_reference.as_dict(),
-            activity_reference=turn_context.activity.as_dict(),
+            references=ConversationReferencePayload(conversation_reference, turn_context.activity),
         )
 
         conv_type = conversation_reference.conversation.conversation_type
@@ -191,6 +211,7 @@ class NotiTeamsBot(ActivityHandler):
         if response is None or turn_context.activity.conversation is None:
             return
         await self.helpers.db.save_message_for_deletion(
+            (turn_context.activity.channel_data or {}).get("tenant", {}).get("id"),
             turn_context.activity.conversation.id,
             response.id,
         )
@@ -20,6 +20,8 @@ class DefaultConfig:
     """Bot Configuration"""
 
     PORT = int(os.environ.get("PORT", "3978"))
+    WORKERS = max(int(os.environ.get("WORKERS", "1")), 1)
+    SHUTDOWN_TIMEOUT = float(os.environ.get("SHUTDOWN_TIMEOUT", "60"))
     APP_ID = os.environ.get("MICROSOFT_APP_ID", "")
     APP_PASSWORD = os.environ.get("MICROSOFT_APP_PASSWORD", "")
     APP_CERTIFICATE = os.environ.get("MICROSOFT_APP_CERTIFICATE", "")
@@ -29,6 +31,43 @@ class DefaultConfig:
     DATABASE_URL = os.environ.get("DATABASE_URL", "")
     DATABASE_POOL_MIN_SIZE = int(os.environ.get("DATABASE_POOL_MIN_SIZE", "1"))
     DATABASE_POOL_MAX_SIZE = int(os.environ.get("DATABASE_POOL_MAX_SIZE", "10"))
+    DATABASE_ACQUIRE_TIMEOUT = float(os.environ.get("DATABASE_ACQUIRE_TIMEOUT", "10"))
+    DATABASE_TENANT_MAX_CONCURRENCY = (
+        int(os.environ.get("DATABASE_TENANT_MAX_CONCURRENCY", "0")) or DATABASE_POOL_MAX_SIZE
+    )
+    DATABASE_CLIENT_SIDE_UUID = os.environ.get("DATABASE_CLIENT_SIDE_UUID", "true").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+    ACTIVITY_RECORD_PATH = os.environ.get("ACTIVITY_RECORD_PATH", "")
+    AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+    AUTH_SIGNING_KEYS_REFRESH_INTERVAL = int(os.environ.get("AUTH_SIGNING_KEYS_REFRESH_INTERVAL", "43200"))
+    PERFORMANCE_PROFILE = os.environ.get("PERFORMANCE_PROFILE", "default")
+    LOG_INFO_SAMPLE_RATE = float(os.environ.get("LOG_INFO_SAMPLE_RATE", "1.0"))
+    ROSTER_PRELOAD_CONCURRENCY = int(os.environ.get("ROSTER_PRELOAD_CONCURRENCY", "2"))
+    ROSTER_PRELOAD_PAGE_SIZE = int(os.environ.get("ROSTER_PRELOAD_PAGE_SIZE", "500"))
+    ROSTER_PRELOAD_QUEUE_SIZE = int(os.environ.get("ROSTER_PRELOAD_QUEUE_SIZE", "4"))
+
+    def check_workers(self) -> None:
+        """Reject settings that can't be shared between WORKERS processes"""
+        if self.WORKERS > self.DATABASE_POOL_MAX_SIZE:
+            raise ValueError(
+                f"WORKERS ({self.WORKERS}) can't be larger than DATABASE_POOL_MAX_SIZE "
+                f"({self.DATABASE_POOL_MAX_SIZE}), each worker needs a database connection"
+            )
+        if self.WORKERS > 1 and self.ACTIVITY_RECORD_PATH:
+            # each worker would append its own gzip stream to the file, interleaving them
+            raise ValueError("ACTIVITY_RECORD_PATH requires WORKERS=1")
+
+    def worker_pool_sizes(self) -> tuple[int, int, int]:
+        """Pool min/max size and tenant concurrency of one worker, the configured values being totals"""
+        self.check_workers()
+        return (
+            max(self.DATABASE_POOL_MIN_SIZE // self.WORKERS, 1),
+            self.DATABASE_POOL_MAX_SIZE // self.WORKERS,
+            max(self.DATABASE_TENANT_MAX_CONCURRENCY // self.WORKERS, 1),
+        )
 
     def get_credential_factory(
         self,
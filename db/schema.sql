@@ -110,7 +110,8 @@ CREATE TABLE public.conversation_reference (
     created_at timestamp with time zone DEFAULT now() NOT NULL,
     updated_at timestamp with time zone,
     conversation_reference jsonb,
-    activity_reference jsonb
+    activity_reference jsonb,
+    reference_hash bytea
 );
 
 
@@ -121,6 +122,13 @@ CREATE TABLE public.conversation_reference (
 COMMENT ON COLUMN public.conversation_reference.conversation_teams_id IS 'teams conversation id, unbounded lenght';
 
 
+--
+-- Name: COLUMN conversation_reference.reference_hash; Type: COMMENT; Schema: public; Owner: -
+--
+
+COMMENT ON COLUMN public.conversation_reference.reference_hash IS 'blake2b-128 of conversation_reference without activity_id, used to skip unchanged refreshes';
+
+
 --
 -- Name: conversation_reference_conversation_reference_id_seq; Type: SEQUENCE; Schema: public; Owner: -
 --
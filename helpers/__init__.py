@@ -6,9 +6,10 @@ from .db_helper import DBHelper
 from .lr_seen import LeastRecentlySeen
 from .message_helper import MessageHelper
 from .msgraph_helper import MSGraphHelper
+from .roster_helper import RosterHelper
 
 
-__all__ = ["MessageHelper", "MSGraphHelper", "LeastRecentlySeen", "DBHelper", "Helpers"]
+__all__ = ["MessageHelper", "MSGraphHelper", "LeastRecentlySeen", "DBHelper", "RosterHelper", "Helpers"]
 
 
 @dataclass
@@ -16,3 +17,4 @@ class Helpers:
     msg: MessageHelper
     graph: MSGraphHelper
     db: DBHelper
+    roster: RosterHelper
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+import gzip
+import hashlib
+import hmac
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from typing import Any
+
+from helpers import json_codec
+
+# String values pseudonymized wherever they appear. channelId is left out, it names the channel
+# type ("msteams") the adapter routes on.
+PSEUDONYMIZED_KEYS = {
+    "id",
+    "aadObjectId",
+    "aadGroupId",
+    "tenantId",
+    "conversationId",
+    "replyToId",
+    "userId",
+    "objectId",
+    "internalId",
+    "messageId",
+    "clientActivityId",
+    "teamsTeamId",
+    "teamsChannelId",
+}
+# String values replaced, they carry content rather than identifiers
+REDACTED_KEYS = {"name", "givenName", "surname", "email", "userPrincipalName", "summary", "speak"}
+# Card submit values are kept for these keys, handlers route on them
+KEPT_VALUE_KEYS = {"action"}
+
+UUID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+TEAMS_ID_RE = re.compile(r"^(?P<prefix>[0-9a-z]+:)?(?P<body>.+?)(?P<suffix>@[\w.]+)?(?P<rest>;.*)?$")
+
+
+class ActivitySanitizer:
+    """Strip personal data from activities while keeping their shape.
+
+    Identifiers are replaced by keyed hashes (the key is random per recording) so the same user or
+    conversation maps to the same pseudonym within a file, and keep their format (UUIDs stay
+    UUIDs, Teams ids keep their ``29:``/``19:...@thread`` decorations).
+    """
+
+    def __init__(self, key: bytes | None = None) -> None:
+        self._key = key or os.urandom(32)
+
+    def _digest(self, value: str) -> bytes:
+        return hmac.new(self._key, value.encode(), hashlib.sha256).digest()
+
+    def pseudonym(self, value: str) -> str:
+        if UUID_RE.match(value):
+            return str(uuid.UUID(bytes=self._digest(value)[:16], version=4))
+        match = TEAMS_ID_RE.match(value)
+        if match is None:
+            return self._digest(value).hex()[:24]
+        return "".join(
+            (
+                match["prefix"] or "",
+                self._digest(match["body"]).hex()[:24],
+                match["suffix"] or "",
+                match["rest"] or "",
+            )
+        )
+
+    def _text(self, text: str) -> str:
+        # keep the keywords the bot reacts to
+        return "help" if "help" in text.lower() else f"text-{len(text)}"
+
+    def sanitize(self, value: Any, key: str | None = None, in_value: bool = False) -> Any:
+        if isinstance(value, dict):
+            return {k: self.sanitize(v, k, in_value or k == "value") for k, v in value.items()}
+        if isinstance(value, list):
+            if key == "attachments":
+                return [{"contentType": a.get("contentType")} for a in value if isinstance(a, dict)]
+            return [self.sanitize(v, key, in_value) for v in value]
+        if not isinstance(value, str):
+            return value
+        if key == "text":
+            return self._text(value)
+        if key in PSEUDONYMIZED_KEYS:
+            return self.pseudonym(value)
+        if key in REDACTED_KEYS:
+            return f"{key}-{self._digest(value).hex()[:8]}"
+        if in_value and key not in KEPT_VALUE_KEYS:
+            return self._digest(value).hex()[:16]
+        return value
+
+
+class ActivityRecorder:
+    """Append sanitized incoming activities to a gzip NDJSON file, from a background thread.
+
+    Each line holds the activity, its arrival offset since the recorder start (``t``), the handling
+    duration and the response status.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._start = time.monotonic()
+        self._queue: queue.SimpleQueue[dict[str, Any] | None] = queue.SimpleQueue()
+        self._sanitizer = ActivitySanitizer()
+        self._thread = threading.Thread(target=self._run, name="activity-recorder", daemon=True)
+        self.log = logging.getLogger(__name__)
+
+    def start(self) -> None:
+        self.log.info(f"recording activities to {self._path}")
+        self._thread.start()
+
+    def record(self, activity: dict[str, Any], started: float, duration: float, status: int) -> None:
+        self._queue.put(
+            {
+                "t": round(started - self._start, 6),
+                "duration": round(duration, 6),
+                "status": status,
+                "activity": activity,
+            }
+        )
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        # gzip members are concatenated when appending to an existing recording
+        with gzip.open(self._path, "at", encoding="utf-8") as output:
+            while (entry := self._queue.get()) is not None:
+                try:
+                    entry["activity"] = self._sanitizer.sanitize(entry["activity"])
+                    output.write(json_codec.dumps(entry) + "\n")
+                except Exception as e:
+                    self.log.exception(f"could not record activity: {e}")
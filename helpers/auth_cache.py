@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from botbuilder.integration.aiohttp import ConfigurationBotFrameworkAuthentication
+from botbuilder.schema import Activity
+from botframework.connector.auth import AuthenticateRequestResult
+from botframework.connector.auth import AuthenticationConstants
+from botframework.connector.auth import JwtTokenExtractor
+
+
+class ValidatedTokenCache:
+    """Bounded LRU of authentication results, each entry expiring at its own deadline"""
+
+    def __init__(self, maxsize: int = 0) -> None:
+        self._maxsize = maxsize
+        self._lock = Lock()
+        self._entries: OrderedDict[bytes, tuple[float, AuthenticateRequestResult]] = OrderedDict()
+
+    def get(self, key: bytes) -> AuthenticateRequestResult | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: bytes, expires_at: float, result: AuthenticateRequestResult) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            if self._maxsize and len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+
+class CachingBotFrameworkAuthentication(ConfigurationBotFrameworkAuthentication):
+    """Skip JWT signature validation for bearer tokens already validated.
+
+    Entries are keyed by a hash of the authorization header, the activity service url (checked
+    against the ``serviceurl`` claim) and the channel id (checked against key endorsements). They
+    expire ``skew`` seconds before the token ``exp`` claim.
+    """
+
+    def __init__(self, *args, cache_size: int = 10_000, skew: int = 30, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._cache = ValidatedTokenCache(cache_size)
+        self._skew = skew
+        self.log = logging.getLogger(__name__)
+
+    async def authenticate_request(self, activity: Activity, auth_header: str) -> AuthenticateRequestResult:
+        if not auth_header:
+            return await super().authenticate_request(activity, auth_header)
+
+        key = hashlib.sha256(
+            "\0".join((auth_header, activity.service_url or "", activity.channel_id or "")).encode()
+        ).digest()
+        cached = self._cache.get(key)
+        if cached is None:
+            cached = await super().authenticate_request(activity, auth_header)
+            exp = cached.claims_identity.claims.get("exp") if cached.claims_identity else None
+            if isinstance(exp, (int, float)):
+                self._cache.set(key, exp - self._skew, cached)
+
+        # The adapter keeps references to the result, hand out a copy
+        result = AuthenticateRequestResult()
+        result.audience = cached.audience
+        result.claims_identity = cached.claims_identity
+        result.caller_id = cached.caller_id
+        result.connector_factory = cached.connector_factory
+        return result
+
+    async def refresh_signing_keys(self) -> None:
+        """Refresh the OpenID signing keys so validation never fetches them inline"""
+        channel_metadata_url = AuthenticationConstants.TO_BOT_FROM_CHANNEL_OPENID_METADATA_URL
+        JwtTokenExtractor.get_open_id_metadata(channel_metadata_url)
+        for url, metadata in list(JwtTokenExtractor.metadataCache.items()):
+            try:
+                # _refresh uses blocking requests, keep it off the event loop
+                await asyncio.to_thread(asyncio.run, metadata._refresh())
+                self.log.info(f"refreshed {len(metadata.keys)} signing keys from {url}")
+            except Exception as e:
+                self.log.exception(f"could not refresh signing keys from {url}: {e}")
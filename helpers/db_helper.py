@@ -1,19 +1,74 @@
 #!/usr/bin/env python3
 import asyncio
-import json
+import hashlib
 import logging
+import time
+import uuid
+from contextlib import AbstractAsyncContextManager
+from contextlib import asynccontextmanager
+from contextlib import AsyncExitStack
 from dataclasses import dataclass
+from functools import cached_property
+from typing import Any
+from typing import AsyncIterator
 
 import asyncpg.connect_utils
 import asyncpg.pgproto.pgproto
 from aiohttp import web
+from botbuilder.schema import Activity
+from botbuilder.schema import ConversationReference
 from opentelemetry import trace
 
 from config import DefaultConfig
+from helpers import json_codec
 from helpers.lr_seen import LeastRecentlySeen
+from helpers.tenant_admission import TenantAdmission
+from helpers.uuid7 import uuid7
 
 tracer = trace.get_tracer(__name__)
 
+# Hot path statements, prepared on every pooled connection at startup (see DBHelper.warm_up)
+UPSERT_AADOID_TO_TID = """
+    INSERT INTO aadoid_to_tid (aad_oid, tenant_id, teams_id, name) VALUES ($1, $2, $3, $4)
+        ON CONFLICT(aad_oid) DO UPDATE
+        SET tenant_id = EXCLUDED.tenant_id,
+            teams_id = EXCLUDED.teams_id,
+            name = COALESCE(EXCLUDED.name, aadoid_to_tid.name)
+"""
+
+SELECT_CONVERSATION_TOKEN = """
+    SELECT cr.conversation_reference_id, cr.reference_hash,
+        conversation_token, conversation_token_id
+    FROM conversation_reference cr
+    LEFT JOIN conversation_token ct USING (conversation_reference_id)
+    WHERE tenant_id = $1 AND conversation_teams_id = $2 AND requester_aadoid = $3
+    ORDER BY ct.created_at ASC LIMIT 1
+"""
+
+INSERT_CONVERSATION_TOKEN = """
+    INSERT INTO conversation_token (
+        conversation_token,
+        conversation_reference_id,
+        user_description
+    ) VALUES (
+        COALESCE($1::uuid, public.uuid_generate_v7()),
+        $2,
+        'default initial token for this conversation'
+    ) RETURNING conversation_token, conversation_token_id
+"""
+
+# pg advisory lock held by the process running the msg_to_delete cleanup
+MSG_TO_DELETE_LOCK_KEY = 0x6E6F746974656D73
+
+INSERT_MSG_TO_DELETE = "INSERT INTO msg_to_delete (conv_id, activity_id) VALUES ($1, $2)"
+
+WARM_UP_STATEMENTS = [
+    UPSERT_AADOID_TO_TID,
+    SELECT_CONVERSATION_TOKEN,
+    INSERT_CONVERSATION_TOKEN,
+    INSERT_MSG_TO_DELETE,
+]
+
 
 @dataclass(kw_only=True)
 class AADOIDInfo:
@@ -26,6 +81,39 @@ class AADOIDInfo:
         return hash((self.aad_iod, self.tenant_id, self.teams_id, self.name))
 
 
+class ConversationReferencePayload:
+    """Lazily serialized conversation and activity references.
+
+    The digest only covers the conversation reference minus its ``activity_id`` (which changes on every
+    activity), the JSON payloads are only built when the stored digest differs.
+    """
+
+    def __init__(self, conversation_reference: ConversationReference, activity: Activity) -> None:
+        self._conversation_reference = conversation_reference
+        self._activity = activity
+
+    @cached_property
+    def _conversation_reference_dict(self) -> dict[str, Any]:
+        ret: dict[str, Any] = self._conversation_reference.as_dict()
+        return ret
+
+    @cached_property
+    def digest(self) -> bytes:
+        content = {k: v for k, v in self._conversation_reference_dict.items() if k != "activity_id"}
+        return hashlib.blake2b(
+            json_codec.dumps(content, sort_keys=True).encode(),
+            digest_size=16,
+        ).digest()
+
+    @cached_property
+    def conversation_reference_json(self) -> str:
+        return json_codec.dumps(self._conversation_reference_dict)
+
+    @cached_property
+    def activity_reference_json(self) -> str:
+        return json_codec.dumps(self._activity.as_dict())
+
+
 class NoResetConnection(asyncpg.connection.Connection):
     def __init__(
         self,
@@ -45,7 +133,11 @@ class DBHelper:
         self._app = app
         self._config = config
         self._pool: asyncpg.Pool | None = None
+        self._pool_min_size, self._pool_max_size, tenant_max_concurrency = config.worker_pool_sizes()
         self._aid_to_tid_lrs = LeastRecentlySeen(10_000)
+        self._admission = TenantAdmission(self._pool_max_size, tenant_max_concurrency)
+        self._lock_connection: asyncpg.Connection | None = None
+        self._held_locks: set[int] = set()
         self.log = logging.getLogger(__name__)
 
     async def pool(self) -> asyncpg.Pool:
@@ -55,31 +147,113 @@ class DBHelper:
                 dsn=self._config.DATABASE_URL,
                 server_settings={"application_name": "notiteams"},
                 connection_class=NoResetConnection,
-                min_size=self._config.DATABASE_POOL_MIN_SIZE,
-                max_size=self._config.DATABASE_POOL_MAX_SIZE,
+                min_size=self._pool_min_size,
+                max_size=self._pool_max_size,
             )
             if self._pool is None:
                 raise RuntimeError("could not create database connection pool")
         return self._pool
 
-    async def acquire(self) -> asyncpg.pool.PoolAcquireContext:
-        return (await self.pool()).acquire()
+    async def close(self) -> None:
+        if self._lock_connection is not None:
+            self._held_locks.clear()
+            connection, self._lock_connection = self._lock_connection, None
+            await connection.close()
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def acquire(self, tenant_id: str | None = None) -> AbstractAsyncContextManager[asyncpg.Connection]:
+        """Connection from the pool once the tenant has been admitted, see TenantAdmission.
+
+        Work without tenant (health check, maintenance) skips admission and only waits for the pool,
+        a long cleanup must not hold a slot tenants compete for.
+        """
+        return self._acquire(await self.pool(), tenant_id or None)
+
+    @asynccontextmanager
+    async def _acquire(self, pool: asyncpg.Pool, tenant_id: str | None) -> AsyncIterator[asyncpg.Connection]:
+        timeout = self._config.DATABASE_ACQUIRE_TIMEOUT
+        if tenant_id is None:
+            async with pool.acquire(timeout=timeout) as connection:
+                yield connection
+            return
+        start = time.monotonic()
+        async with self._admission.slot(tenant_id, timeout):
+            remaining = max(timeout - (time.monotonic() - start), 0.001)
+            async with pool.acquire(timeout=remaining) as connection:
+                yield connection
+
+    def new_uuid(self) -> uuid.UUID | None:
+        """UUIDv7 for inserts, None to let the database default generate it"""
+        if self._config.DATABASE_CLIENT_SIDE_UUID:
+            return uuid7()
+        return None
 
     async def check_connection(self):
         async with await self.acquire() as connection:
             await connection.fetchval("SELECT 1")
 
-    async def save_message_for_deletion(self, conv_id: str, activity_id: str) -> None:
-        connection: asyncpg.pool.PoolConnectionProxy
-        async with await self.acquire() as connection:
-            stmt = await connection.prepare(
-                "INSERT INTO msg_to_delete (conv_id, activity_id) VALUES ($1, $2)"
+    async def lock_connection(self) -> asyncpg.Connection:
+        """Dedicated connection for session advisory locks, opened once per process.
+
+        Pool connections are not reset on release, a session lock taken on one would leak to
+        whoever gets it next.
+        """
+        if self._lock_connection is None:
+            self._lock_connection = await asyncpg.connect(
+                dsn=self._config.DATABASE_URL,
+                server_settings={"application_name": "notiteams"},
             )
-            await stmt.fetch(
+        return self._lock_connection
+
+    async def hold_advisory_lock(self, key: int) -> bool:
+        """Take or keep the session advisory lock ``key``, returns whether this process holds it.
+
+        Locks are released on close() or when the lock connection is lost, letting another process
+        take over.
+        """
+        connection = await self.lock_connection()
+        try:
+            if key in self._held_locks:
+                await connection.fetchval("SELECT 1")
+                return True
+            locked = await connection.fetchval("SELECT pg_try_advisory_lock($1)", key)
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError) as e:
+            # the server releases the locks with the connection, start over with a new one
+            if self._held_locks:
+                self.log.warning(f"lost advisory locks {', '.join(f'{k:#x}' for k in self._held_locks)}: {e}")
+            self._held_locks.clear()
+            self._lock_connection = None
+            connection.terminate()
+            raise
+        if locked:
+            self.log.info(f"acquired advisory lock {key:#x}")
+            self._held_locks.add(key)
+        return bool(locked)
+
+    async def warm_up(self) -> None:
+        """Open the pool up to its min size and prepare the hot statements on each connection"""
+        pool = await self.pool()
+        async with AsyncExitStack() as stack:
+            connections = [
+                await stack.enter_async_context(pool.acquire()) for _ in range(self._pool_min_size)
+            ]
+            await asyncio.gather(*(self._prepare_statements(connection) for connection in connections))
+
+    async def _prepare_statements(self, connection: asyncpg.pool.PoolConnectionProxy) -> None:
+        for query in WARM_UP_STATEMENTS:
+            # public prepare() bypasses the statement cache used by fetch/execute
+            await connection._prepare(query, use_cache=True)
+
+    async def save_message_for_deletion(self, tenant_id: str | None, conv_id: str, activity_id: str) -> None:
+        connection: asyncpg.pool.PoolConnectionProxy
+        async with await self.acquire(tenant_id) as connection:
+            await connection.execute(
+                INSERT_MSG_TO_DELETE,
                 conv_id,
                 activity_id,
             )
-            # print(stmt.get_statusmsg())
 
     @tracer.start_as_current_span("save_aadoid_to_tid")
     async def save_aadoid_to_tid(self, aadinfo: AADOIDInfo) -> None:
@@ -87,22 +261,63 @@ class DBHelper:
         if self._aid_to_tid_lrs.look_and_remember(record):
             self.log.debug(f"already saved aadoid infos {record}")
             return
-        async with await self.acquire() as connection:
+        async with await self.acquire(aadinfo.tenant_id) as connection:
             self.log.debug(f"saving aadoid infos {record}")
             await connection.execute(
-                """
-                INSERT INTO aadoid_to_tid (aad_oid, tenant_id, teams_id, name) VALUES ($1, $2, $3, $4)
-                    ON CONFLICT(aad_oid) DO UPDATE
-                    SET tenant_id = EXCLUDED.tenant_id,
-                        teams_id = EXCLUDED.teams_id,
-                        name = COALESCE(EXCLUDED.name, aadoid_to_tid.name)
-                """,
+                UPSERT_AADOID_TO_TID,
                 aadinfo.aad_iod,
                 aadinfo.tenant_id,
                 aadinfo.teams_id,
                 aadinfo.name,
             )
 
+    @tracer.start_as_current_span("bulk_save_aadoid_to_tid")
+    async def bulk_save_aadoid_to_tid(self, tenant_id: str, aadinfos: list[AADOIDInfo]) -> int:
+        """COPY into a staging table then merge into aadoid_to_tid, returns the number of rows written.
+
+        Unchanged rows are skipped by the merge, the request path cache is left alone so a large
+        roster doesn't evict it.
+        """
+        records = [
+            (aadinfo.aad_iod, aadinfo.tenant_id, aadinfo.teams_id, aadinfo.name) for aadinfo in aadinfos
+        ]
+        if not records:
+            return 0
+        connection: asyncpg.pool.PoolConnectionProxy
+        async with await self.acquire(tenant_id) as connection:
+            async with connection.transaction():
+                # Connections are not reset on release, the staging table must go with the transaction
+                await connection.execute(
+                    """
+                    CREATE TEMPORARY TABLE aadoid_to_tid_staging (
+                        aad_oid uuid NOT NULL,
+                        tenant_id character varying NOT NULL,
+                        teams_id character varying NOT NULL,
+                        name character varying
+                    ) ON COMMIT DROP
+                    """
+                )
+                await connection.copy_records_to_table(
+                    "aadoid_to_tid_staging",
+                    records=records,
+                    columns=["aad_oid", "tenant_id", "teams_id", "name"],
+                )
+                status = await connection.execute(
+                    """
+                    INSERT INTO aadoid_to_tid (aad_oid, tenant_id, teams_id, name)
+                        SELECT DISTINCT ON (aad_oid) aad_oid, tenant_id, teams_id, name
+                        FROM aadoid_to_tid_staging
+                        ON CONFLICT(aad_oid) DO UPDATE
+                        SET tenant_id = EXCLUDED.tenant_id,
+                            teams_id = EXCLUDED.teams_id,
+                            name = COALESCE(EXCLUDED.name, aadoid_to_tid.name)
+                        WHERE (aadoid_to_tid.tenant_id, aadoid_to_tid.teams_id, aadoid_to_tid.name)
+                            IS DISTINCT FROM (EXCLUDED.tenant_id, EXCLUDED.teams_id,
+                                COALESCE(EXCLUDED.name, aadoid_to_tid.name))
+                    """
+                )
+        return int(status.split()[-1])
+
     @tracer.start_as_current_span("get_token")
     async def get_token(
         self,
@@ -110,8 +325,7 @@ class DBHelper:
         tenant_id: str,
         conversation_teams_id: str,
         requester_aadoid: str,
-        conversation_reference: str,
-        activity_reference: str,
+        references: ConversationReferencePayload,
     ) -> str:
         # Two assumption here:
         # - teams direct line reaction time is not that great a shouldn't create race condition
@@ -120,15 +334,9 @@ class DBHelper:
         conversation_reference_id = -1
         conversation_token_id = -1
         span = trace.get_current_span()
-        async with await self.acquire() as connection:
+        async with await self.acquire(tenant_id) as connection:
             selectres = await connection.fetchrow(
-                """
-                SELECT cr.conversation_reference_id, conversation_token, conversation_token_id
-                FROM conversation_reference cr
-                LEFT JOIN conversation_token ct USING (conversation_reference_id)
-                WHERE tenant_id = $1 AND conversation_teams_id = $2 AND requester_aadoid = $3
-                ORDER BY ct.created_at ASC LIMIT 1
-                """,
+                SELECT_CONVERSATION_TOKEN,
                 tenant_id,
                 conversation_teams_id,
                 requester_aadoid,
@@ -143,36 +351,50 @@ class DBHelper:
                         conversation_teams_id,
                         requester_aadoid,
                         conversation_reference,
-                        activity_reference
-                    ) VALUES ($1, $2, $3, $4, $5)
+                        activity_reference,
+                        reference_hash
+                    ) VALUES ($1, $2, $3, $4, $5, $6)
                         ON CONFLICT(tenant_id, conversation_teams_id, requester_aadoid)
                         DO NOTHING RETURNING conversation_reference_id
                     """,
                     tenant_id,
                     conversation_teams_id,
                     requester_aadoid,
-                    json.dumps(conversation_reference),
-                    json.dumps(activity_reference),
+                    references.conversation_reference_json,
+                    references.activity_reference_json,
+                    references.digest,
                 )
                 assert inserted_convref is not None
                 conversation_reference_id = inserted_convref["conversation_reference_id"]
             else:
                 # Conversation reference yes, token, not sure
                 conversation_reference_id = selectres["conversation_reference_id"]
+                if selectres["reference_hash"] != references.digest:
+                    self.log.debug(f"refreshing conversation reference {conversation_reference_id}")
+                    await connection.execute(
+                        """
+                        UPDATE conversation_reference
+                        SET conversation_reference = $2,
+                            activity_reference = $3,
+                            reference_hash = $4
+                        WHERE conversation_reference_id = $1
+                        """,
+                        conversation_reference_id,
+                        references.conversation_reference_json,
+                        references.activity_reference_json,
+                        references.digest,
+                    )
+                    span.set_attribute("notiteams.conversation_reference_refreshed", True)
                 if selectres["conversation_token"]:
                     token = selectres["conversation_token"]
                     conversation_token_id = selectres["conversation_token_id"]
 
             # Now we have a conversation_reference_id
             if not token:
+                # uuid generated client side unless disabled, the plpgsql function is kept as fallback
                 insertres = await connection.fetchrow(
-                    """
-                    INSERT INTO conversation_token (
-                        conversation_reference_id,
-                        user_description
-                    ) VALUES ($1, 'default initial token for this conversation')
-                        RETURNING conversation_token, conversation_token_id
-                    """,
+                    INSERT_CONVERSATION_TOKEN,
+                    self.new_uuid(),
                     conversation_reference_id,
                 )
                 if insertres is None:
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""JSON encoding and decoding used by the project's own code.
+
+Backed by the standard library unless ``use_orjson()`` was called (performance profile ``fast``).
+Both produce the same compact, non-ASCII-escaped output so content hashes don't change with the
+profile.
+"""
+import json
+from typing import Any
+from typing import Callable
+
+_dumps: Callable[[Any, bool], str]
+_loads: Callable[[str | bytes], Any]
+
+
+def _std_dumps(value: Any, sort_keys: bool) -> str:
+    return json.dumps(value, sort_keys=sort_keys, separators=(",", ":"), ensure_ascii=False)
+
+
+_dumps = _std_dumps
+_loads = json.loads
+
+
+def use_orjson() -> None:
+    """Route dumps/loads through orjson, raises ImportError if it is not installed"""
+    global _dumps, _loads
+    import orjson
+
+    def orjson_dumps(value: Any, sort_keys: bool) -> str:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(value, option=option).decode()
+
+    _dumps = orjson_dumps
+    _loads = orjson.loads
+
+
+def dumps(value: Any, sort_keys: bool = False) -> str:
+    return _dumps(value, sort_keys)
+
+
+def loads(value: str | bytes) -> Any:
+    return _loads(value)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import atexit
+import copy
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+from typing import Any
+
+from helpers import json_codec
+
+
+class LazyJSON:
+    """Defer JSON encoding of a log payload until a record is actually emitted"""
+
+    __slots__ = ("_value", "_dumped")
+
+    def __init__(self, value: Any) -> None:
+        self._value = value
+        self._dumped: str | None = None
+
+    def __str__(self) -> str:
+        if self._dumped is None:
+            self._dumped = json_codec.dumps(self._value)
+        return self._dumped
+
+    __repr__ = __str__
+
+
+def _resolve_lazy(record: logging.LogRecord) -> None:
+    for key, value in record.__dict__.items():
+        if isinstance(value, LazyJSON):
+            record.__dict__[key] = str(value)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only ``rate`` of the records below WARNING"""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class ResolveLazyFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        _resolve_lazy(record)
+        return True
+
+
+# Arguments safe to format later, on the listener thread
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None), LazyJSON)
+_exception_formatter = logging.Formatter()
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Hand the listener a copy of the record detached from objects the event loop may still change.
+
+    The stdlib version formats the whole message in the calling thread. Here formatting is left to
+    the listener when the arguments are immutable, LazyJSON payloads are encoded (not formatted)
+    right away and anything else falls back to the stdlib behavior.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        _resolve_lazy(record)
+        args = record.args
+        if isinstance(args, tuple):
+            for arg in args:
+                if isinstance(arg, LazyJSON):
+                    # encoded now, the cached string is what the listener formats
+                    str(arg)
+        if (
+            not isinstance(record.msg, str)
+            or isinstance(args, dict)
+            or any(not isinstance(arg, _IMMUTABLE_ARGS) for arg in args or ())
+        ):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _StoppableQueueListener(QueueListener):
+    # stop() can run twice (atexit and explicit shutdown)
+    def stop(self) -> None:
+        if self._thread is not None:  # type: ignore[attr-defined]
+            super().stop()
+
+
+def init_log_pipeline(sample_rate: float = 1.0) -> QueueListener:
+    """Move the root logger handlers behind a queue processed by a background thread.
+
+    Records are detached when queued (``LazyJSON`` encoded, tracebacks rendered, messages with
+    mutable arguments formatted), formatting immutable arguments and writing happen on the listener
+    thread. The OpenTelemetry handler stays inline as it needs the current span and already exports
+    in batch.
+    """
+    root = logging.getLogger()
+    sampling = SamplingFilter(sample_rate)
+    queued_handlers = []
+    for handler in list(root.handlers):
+        # matched by module to avoid importing the opentelemetry sdk when not instrumented
+        if type(handler).__module__.startswith("opentelemetry.sdk._logs"):
+            handler.addFilter(sampling)
+            handler.addFilter(ResolveLazyFilter())
+            continue
+        root.removeHandler(handler)
+        queued_handlers.append(handler)
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(sampling)
+    root.addHandler(queue_handler)
+
+    listener = _StoppableQueueListener(log_queue, *queued_handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -1,9 +1,12 @@
+import asyncio
+
 from aiohttp import web
 from botbuilder.integration.aiohttp import CloudAdapter
 from botbuilder.schema import Activity
 from botbuilder.schema import ChannelAccount
 from botbuilder.schema import ConversationParameters
 from botbuilder.schema import ResourceResponse
+from botbuilder.schema.teams import TeamsPagedMembersResult
 from botframework.connector.aio import ConnectorClient
 from botframework.connector.auth import AuthenticationConstants
 from opentelemetry import trace
@@ -12,29 +15,55 @@ from config import DefaultConfig
 
 tracer = trace.get_tracer(__name__)
 
+DEFAULT_SERVICE_URL = "https://smba.trafficmanager.net/amer/"
+
 
 class MessageHelper:
     def __init__(self, app: web.Application, adapter: CloudAdapter, config: DefaultConfig) -> None:
         self._app = app
         self._config = config
         self._adapter = adapter
-        self._connector_client_inst: ConnectorClient | None = None
+        self._connector_clients: dict[str, ConnectorClient] = {}
 
-    async def _connector_client(self) -> ConnectorClient:
-        if self._connector_client_inst is None:
-            service_url = "https://smba.trafficmanager.net/amer/"
+    async def _connector_client(self, service_url: str | None = None) -> ConnectorClient:
+        service_url = service_url or DEFAULT_SERVICE_URL
+        if service_url not in self._connector_clients:
             claims_identity = self._adapter.create_claims_identity(self._config.APP_ID)
             claims_identity.claims[AuthenticationConstants.SERVICE_URL_CLAIM] = service_url
             connector_factory = self._adapter.bot_framework_authentication.create_connector_factory(
                 claims_identity
             )
-            self._connector_client_inst = await connector_factory.create(service_url, "")
-        return self._connector_client_inst
+            self._connector_clients[service_url] = await connector_factory.create(service_url, "")
+        return self._connector_clients[service_url]
+
+    async def warm_up(self) -> None:
+        """Create the default connector client and fetch its bot framework token"""
+        client = await self._connector_client()
+        if not self._config.APP_ID:
+            # authentication disabled (emulator, replay), no token to fetch
+            return
+        await asyncio.to_thread(client.config.credentials.get_access_token)
 
     async def delete_message(self, conversation_id: str, activity_id: str):
         client = await self._connector_client()
         await client.conversations.delete_activity(conversation_id, activity_id)
 
+    @tracer.start_as_current_span("get_paged_team_members")
+    async def get_paged_team_members(
+        self,
+        service_url: str,
+        team_id: str,
+        continuation_token: str | None = None,
+        page_size: int | None = None,
+    ) -> TeamsPagedMembersResult:
+        client = await self._connector_client(service_url)
+        result: TeamsPagedMembersResult = await client.conversations.get_teams_conversation_paged_members(
+            team_id,
+            page_size,
+            continuation_token,
+        )
+        return result
+
     @tracer.start_as_current_span("send_private_message")
     async def send_private_message(
         self,
@@ -64,7 +93,7 @@ class MessageHelper:
                     is_group=False,
                     tenant_id=tenant_id,
                 ),
-                service_url="https://smba.trafficmanager.net/amer/",
+                service_url=DEFAULT_SERVICE_URL,
             )
             if activity_response is not None:
                 assert isinstance(activity_response, ResourceResponse)
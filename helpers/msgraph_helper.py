@@ -55,6 +55,12 @@ class MSGraphHelper:
                     "Content-Type": "application/json",
                 }
 
+    async def warm_up(self) -> None:
+        if not self._config.APP_TENANTID or not self._config.APP_PASSWORD:
+            logger.info("skipping graph token warm up, requires MICROSOFT_APP_TENANT_ID and password")
+            return
+        await self._check_token()
+
     @tracer.start_as_current_span("query")
     async def _query(self, target: str, params=None, method="GET", json=None) -> Any:
         await self._check_token()
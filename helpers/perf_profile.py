@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+from typing import Callable
+
+from helpers import json_codec
+
+PROFILES = ("default", "fast")
+
+logger = logging.getLogger(__name__)
+
+
+def apply_performance_profile(profile: str) -> Callable[[], asyncio.AbstractEventLoop]:
+    """Configure the JSON codec for ``profile`` and return the event loop factory to run the app with.
+
+    ``fast`` uses uvloop and orjson, each falls back to the standard library with a warning when
+    the package is not installed.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"unknown PERFORMANCE_PROFILE '{profile}', expected one of {', '.join(PROFILES)}")
+
+    loop_factory: Callable[[], asyncio.AbstractEventLoop] = asyncio.new_event_loop
+    if profile == "fast":
+        try:
+            json_codec.use_orjson()
+        except ImportError:
+            logger.warning("orjson is not installed, using the standard json module")
+        try:
+            import uvloop
+
+            loop_factory = uvloop.new_event_loop
+        except ImportError:
+            logger.warning("uvloop is not installed, using the default asyncio event loop")
+    logger.info(f"using performance profile {profile}")
+    return loop_factory
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import threading
+import time
+from typing import Callable
+
+log = logging.getLogger(__name__)
+
+
+def _watch_parent(parent_alive: multiprocessing.connection.Connection) -> None:
+    # the supervisor never writes, EOF means it is gone
+    try:
+        parent_alive.recv()
+    except EOFError:
+        pass
+    log.warning("supervisor exited, stopping worker")
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def _worker_main(target: Callable[[], None], parent_alive: multiprocessing.connection.Connection) -> None:
+    # out of the terminal process group, ^C reaches the supervisor only and it relays a single SIGTERM
+    os.setpgrp()
+    threading.Thread(target=_watch_parent, args=(parent_alive,), name="parent-watch", daemon=True).start()
+    target()
+
+
+def run_workers(target: Callable[[], None], workers: int, shutdown_timeout: float) -> int:
+    """Run ``target`` in ``workers`` processes until SIGTERM/SIGINT or until one of them exits.
+
+    Workers are spawned (not forked) so each one starts its own threads, event loop and
+    instrumentation. On shutdown every worker gets SIGTERM and up to ``shutdown_timeout``
+    seconds to finish, stragglers are killed. Returns the supervisor exit code.
+    """
+    context = multiprocessing.get_context("spawn")
+    parent_alive, keep_alive = context.Pipe(duplex=False)
+    stopping = threading.Event()
+
+    def request_stop(signum, frame):
+        log.info(f"received {signal.Signals(signum).name}, stopping {workers} workers")
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    processes = [
+        context.Process(target=_worker_main, args=(target, parent_alive), name=f"worker-{index}")
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+        log.info(f"started {process.name} (pid {process.pid})")
+    parent_alive.close()
+
+    while not stopping.is_set():
+        # short timeout so signals are handled promptly
+        if multiprocessing.connection.wait([process.sentinel for process in processes], timeout=0.5):
+            break
+
+    failed = [process for process in processes if process.exitcode is not None]
+    for process in failed:
+        log.error(f"{process.name} exited with code {process.exitcode}, stopping the other workers")
+
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    deadline = time.monotonic() + shutdown_timeout
+    for process in processes:
+        process.join(max(deadline - time.monotonic(), 0))
+        if process.is_alive():
+            log.warning(f"{process.name} did not stop within {shutdown_timeout}s, killing it")
+            process.kill()
+            process.join()
+    keep_alive.close()
+
+    if failed or any(process.exitcode for process in processes if process.exitcode != -signal.SIGTERM):
+        return 1
+    return 0
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+import time
+
+from aiohttp import web
+from opentelemetry import trace
+
+from config import DefaultConfig
+from helpers.db_helper import AADOIDInfo
+from helpers.db_helper import DBHelper
+from helpers.message_helper import MessageHelper
+
+tracer = trace.get_tracer(__name__)
+
+
+class RosterHelper:
+    """Background preload of team rosters into aadoid_to_tid.
+
+    At most ``ROSTER_PRELOAD_CONCURRENCY`` teams are loaded at once. Within a team, pages are
+    fetched sequentially (continuation token) while the previous page is being written, with at
+    most ``ROSTER_PRELOAD_QUEUE_SIZE`` pages waiting to be written.
+    """
+
+    def __init__(self, app: web.Application, msg: MessageHelper, db: DBHelper, config: DefaultConfig) -> None:
+        self._app = app
+        self._config = config
+        self._msg = msg
+        self._db = db
+        self._semaphore = asyncio.Semaphore(max(config.ROSTER_PRELOAD_CONCURRENCY, 1))
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+        self.log = logging.getLogger(__name__)
+
+    def schedule(self, *, tenant_id: str, service_url: str, team_id: str) -> None:
+        if self._config.ROSTER_PRELOAD_CONCURRENCY <= 0:
+            return
+        if team_id in self._tasks:
+            self.log.debug(f"roster preload already running for team {team_id}")
+            return
+        task = asyncio.create_task(
+            self._preload(tenant_id=tenant_id, service_url=service_url, team_id=team_id)
+        )
+        self._tasks[team_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(team_id, None))
+
+    async def close(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _preload(self, *, tenant_id: str, service_url: str, team_id: str) -> None:
+        try:
+            async with self._semaphore:
+                await self.preload(tenant_id=tenant_id, service_url=service_url, team_id=team_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.log.exception(f"roster preload failed for team {team_id}: {e}")
+
+    @tracer.start_as_current_span("roster_preload")
+    async def preload(self, *, tenant_id: str, service_url: str, team_id: str) -> int:
+        span = trace.get_current_span()
+        queue: asyncio.Queue[list[AADOIDInfo] | None] = asyncio.Queue(
+            maxsize=max(self._config.ROSTER_PRELOAD_QUEUE_SIZE, 1)
+        )
+        start = time.monotonic()
+        fetched = 0
+        written = 0
+
+        async def writer() -> None:
+            nonlocal written
+            while (page := await queue.get()) is not None:
+                written += await self._db.bulk_save_aadoid_to_tid(tenant_id, page)
+
+        async def put(page: list[AADOIDInfo] | None) -> None:
+            # surface writer errors instead of blocking forever on a full queue
+            put_task = asyncio.create_task(queue.put(page))
+            await asyncio.wait({put_task, writer_task}, return_when=asyncio.FIRST_COMPLETED)
+            if not put_task.done():
+                put_task.cancel()
+                writer_task.result()
+
+        writer_task = asyncio.create_task(writer())
+        try:
+            continuation_token: str | None = None
+            while True:
+                result = await self._msg.get_paged_team_members(
+                    service_url,
+                    team_id,
+                    continuation_token,
+                    self._config.ROSTER_PRELOAD_PAGE_SIZE,
+                )
+                page = [
+                    AADOIDInfo(
+                        aad_iod=member.aad_object_id,
+                        tenant_id=member.tenant_id or tenant_id,
+                        teams_id=member.id,
+                        name=member.name,
+                    )
+                    for member in result.members or []
+                    if member.aad_object_id is not None
+                ]
+                fetched += len(page)
+                await put(page)
+
+                elapsed = time.monotonic() - start
+                self.log.info(
+                    f"roster preload team {team_id}: {fetched} members fetched, {written} written, "
+                    f"{fetched / elapsed if elapsed else 0:.0f} members/s"
+                )
+                continuation_token = result.continuation_token
+                if not continuation_token:
+                    break
+            await put(None)
+            await writer_task
+        finally:
+            writer_task.cancel()
+
+        elapsed = time.monotonic() - start
+        span.set_attributes(
+            {
+                "notiteams.roster.members_fetched": fetched,
+                "notiteams.roster.rows_written": written,
+            }
+        )
+        self.log.info(
+            f"roster preload team {team_id} done: {fetched} members fetched, {written} written "
+            f"in {elapsed:.1f}s ({fetched / elapsed if elapsed else 0:.0f} members/s)"
+        )
+        return written
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from collections import deque
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from opentelemetry import metrics
+from opentelemetry import trace
+
+meter = metrics.get_meter(__name__)
+wait_histogram = meter.create_histogram(
+    "notiteams.db.admission.wait",
+    unit="s",
+    description="Time spent waiting for a database slot",
+)
+timeout_counter = meter.create_counter(
+    "notiteams.db.admission.timeouts",
+    description="Database slot requests that timed out",
+)
+
+
+class TenantAdmission:
+    """Fair admission of tenants to a shared pool of ``capacity`` slots.
+
+    A tenant never holds more than ``per_tenant_limit`` slots. When slots are released, waiting
+    tenants are served round-robin so a tenant with a deep queue can't starve the others.
+    """
+
+    def __init__(self, capacity: int, per_tenant_limit: int) -> None:
+        self._capacity = max(capacity, 1)
+        self._per_tenant_limit = max(min(per_tenant_limit, self._capacity), 1)
+        self._in_use = 0
+        self._tenant_in_use: defaultdict[str, int] = defaultdict(int)
+        # round-robin order of tenants with waiters
+        self._waiters: OrderedDict[str, deque[asyncio.Future[None]]] = OrderedDict()
+        self.log = logging.getLogger(__name__)
+
+    def _can_admit(self, tenant: str) -> bool:
+        return (
+            self._in_use < self._capacity and self._tenant_in_use.get(tenant, 0) < self._per_tenant_limit
+        )
+
+    def _admit(self, tenant: str) -> None:
+        self._in_use += 1
+        self._tenant_in_use[tenant] += 1
+
+    def _release(self, tenant: str) -> None:
+        self._in_use -= 1
+        self._tenant_in_use[tenant] -= 1
+        if not self._tenant_in_use[tenant]:
+            del self._tenant_in_use[tenant]
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        for tenant in list(self._waiters):
+            if self._in_use >= self._capacity:
+                return
+            waiters = self._waiters[tenant]
+            while waiters and waiters[0].done():
+                waiters.popleft()
+            if waiters and self._can_admit(tenant):
+                self._admit(tenant)
+                waiters.popleft().set_result(None)
+            if waiters:
+                # served (or capped) tenants go to the back of the line
+                self._waiters.move_to_end(tenant)
+            else:
+                del self._waiters[tenant]
+
+    @asynccontextmanager
+    async def slot(self, tenant: str, timeout: float | None = None) -> AsyncIterator[None]:
+        start = time.monotonic()
+        # tenants are unbounded, they go on the span and in logs but not in metric attributes
+        span = trace.get_current_span()
+        span.set_attribute("notiteams.db.admission_tenant", tenant)
+        if tenant not in self._waiters and self._can_admit(tenant):
+            self._admit(tenant)
+        else:
+            waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(tenant, deque()).append(waiter)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if waiter.done() and not waiter.cancelled():
+                    # admitted right as we gave up, hand the slot over
+                    self._release(tenant)
+                else:
+                    waiter.cancel()
+                if isinstance(e, asyncio.TimeoutError):
+                    timeout_counter.add(1)
+                    self.log.warning(
+                        f"database admission timed out after {timeout}s for tenant '{tenant}' "
+                        f"({self._tenant_in_use.get(tenant, 0)} slots in use, "
+                        f"{self._in_use}/{self._capacity} total)"
+                    )
+                    raise asyncio.TimeoutError(f"database admission timed out for tenant '{tenant}'") from e
+                raise
+
+        wait = time.monotonic() - start
+        wait_histogram.record(wait)
+        span.set_attribute("notiteams.db.admission_wait", wait)
+        try:
+            yield
+        finally:
+            self._release(tenant)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import os
+import time
+import uuid
+from threading import Lock
+
+
+class UUIDv7Generator:
+    """Monotonic UUIDv7 generator (RFC 9562, method 3).
+
+    The 48 bits timestamp is in milliseconds, the 12 bits ``rand_a`` field is used as a
+    counter seeded randomly on each new millisecond so ids generated within the same
+    millisecond stay ordered. On counter overflow (or if the clock goes backward),
+    the timestamp is advanced by one millisecond.
+    """
+
+    _COUNTER_MAX = 0xFFF
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._last_ms = 0
+        self._counter = 0
+
+    def generate(self) -> uuid.UUID:
+        now_ms = time.time_ns() // 1_000_000
+        rand = int.from_bytes(os.urandom(8), "big")
+        with self._lock:
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                # keep the upper bit clear to leave room for increments
+                self._counter = (rand >> 53) & 0x7FF
+            elif self._counter < self._COUNTER_MAX:
+                self._counter += 1
+            else:
+                self._last_ms += 1
+                self._counter = (rand >> 53) & 0x7FF
+            unix_ts_ms = self._last_ms
+            counter = self._counter
+
+        value = (unix_ts_ms & 0xFFFF_FFFF_FFFF) << 80
+        value |= 0x7 << 76
+        value |= counter << 64
+        value |= 0b10 << 62
+        value |= rand & 0x3FFF_FFFF_FFFF_FFFF
+        return uuid.UUID(int=value)
+
+
+_generator = UUIDv7Generator()
+
+
+def uuid7() -> uuid.UUID:
+    return _generator.generate()